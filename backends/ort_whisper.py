@@ -0,0 +1,101 @@
+"""ONNX Runtime Whisper backend (selected with WHISPER_BACKEND=ort).
+
+Needs the optional `optimum[onnxruntime]` dependency. The model is exported
+to ONNX and dynamically quantized to INT8 once, then reused from disk.
+"""
+import os
+from collections import namedtuple
+
+# Mirrors the `.text` attribute of faster-whisper segments
+Segment = namedtuple("Segment", ["text"])
+
+# Exported models are cached per model name under this directory
+ORT_MODEL_ROOT = os.environ.get("ORT_MODEL_ROOT", ".")
+
+# Whisper decodes audio in 30 s windows
+CHUNK_LENGTH_S = 30
+
+
+class OrtWhisperModel:
+    """Minimal `transcribe()`-compatible wrapper around an ORT Whisper pipeline."""
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def transcribe(self, audio, language=None, beam_size=1, batch_size=8, **kwargs):
+        """Transcribes 16 kHz float32 PCM and returns (segments, info)."""
+        generate_kwargs = {"task": "transcribe", "num_beams": beam_size}
+        if language is not None:
+            generate_kwargs["language"] = language
+        result = self.pipe(audio,
+                           chunk_length_s=CHUNK_LENGTH_S,
+                           batch_size=batch_size,
+                           generate_kwargs=generate_kwargs)
+        return iter([Segment(result["text"])]), None
+
+
+def _export_and_quantize(model_id, output_dir):
+    """Exports `model_id` to ONNX and writes INT8-quantized graphs to `output_dir`."""
+    import shutil
+    import tempfile
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import GenerationConfig, WhisperProcessor
+
+    # Dynamic INT8 quantization of the MatMul weights; ORT's QGemm kernels
+    # use VNNI where the CPU supports it
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    # Build everything in a staging directory next to `output_dir` and move it
+    # into place only once complete, so a failed export is never mistaken
+    # for a finished one on the next start
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=".export-", dir=parent)
+    try:
+        with tempfile.TemporaryDirectory() as export_dir:
+            ORTModelForSpeechSeq2Seq.from_pretrained(model_id, export=True).save_pretrained(export_dir)
+            for file_name in ("encoder_model.onnx", "decoder_model.onnx", "decoder_with_past_model.onnx"):
+                quantizer = ORTQuantizer.from_pretrained(export_dir, file_name=file_name)
+                quantizer.quantize(save_dir=staging_dir, quantization_config=qconfig)
+        WhisperProcessor.from_pretrained(model_id).save_pretrained(staging_dir)
+        # The quantizer does not copy it, and without the Whisper-specific
+        # generation config (lang_to_id, task_to_id) generate() rejects the
+        # task/language arguments
+        GenerationConfig.from_pretrained(model_id).save_pretrained(staging_dir)
+        os.replace(staging_dir, output_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+
+def load_model(model, cpu_threads):
+    """Loads (exporting on first use) an INT8 ONNX Runtime Whisper model."""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    from transformers import WhisperProcessor, pipeline
+
+    if os.path.isdir(model):
+        raise ValueError(f"The ort backend exports from the Hugging Face Hub and cannot load "
+                         f"the local CTranslate2 model {model!r}; use a size name such as 'small'")
+    # Size names map to the official checkpoints; anything else is a Hub id
+    model_id = model if "/" in model else f"openai/whisper-{model}"
+    model_dir = os.path.join(ORT_MODEL_ROOT, f"{model_id.rsplit('/', 1)[-1]}-onnx-int8")
+    if not os.path.isdir(model_dir):
+        _export_and_quantize(model_id, model_dir)
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = cpu_threads
+    ort_model = ORTModelForSpeechSeq2Seq.from_pretrained(
+        model_dir,
+        provider="CPUExecutionProvider",
+        session_options=session_options,
+        encoder_file_name="encoder_model_quantized.onnx",
+        decoder_file_name="decoder_model_quantized.onnx",
+        decoder_with_past_file_name="decoder_with_past_model_quantized.onnx",
+    )
+    processor = WhisperProcessor.from_pretrained(model_dir)
+    pipe = pipeline("automatic-speech-recognition",
+                    model=ort_model,
+                    tokenizer=processor.tokenizer,
+                    feature_extractor=processor.feature_extractor)
+    return OrtWhisperModel(pipe)
@@ -1,37 +1,255 @@
+import os
+
+# Usable CPU cores (respects container/affinity limits where supported)
+try:
+    CPU_THREADS = len(os.sched_getaffinity(0))
+except AttributeError:
+    CPU_THREADS = os.cpu_count() or 1
+
+# The model runs as several workers of ~4 threads each (decoder latency
+# stops improving beyond that) that share the cores; audio is split at
+# silences so every worker gets a slice
+PARALLEL_WORKERS = max(1, CPU_THREADS // 4)
+
+# Pin OpenMP/MKL pools *before* importing faster_whisper so they don't
+# spawn a second threadpool that oversubscribes the cores
+os.environ.setdefault("OMP_NUM_THREADS", str(CPU_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(CPU_THREADS))
+
 import streamlit as st
-from faster_whisper import WhisperModel
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import numpy as np
+from collections import OrderedDict
+import threading
 import traceback
 import time
-import os
-import tempfile
+import xxhash
+
+# "faster_whisper" (default) or "ort" (ONNX Runtime, see backends/ort_whisper.py)
+WHISPER_BACKEND = os.environ.get("WHISPER_BACKEND", "faster_whisper")
+
+# Whisper expects 16 kHz mono float32 PCM
+SAMPLING_RATE = 16000
+
+# Default model: WHISPER_MODEL may point to a pre-converted, pre-quantized
+# CTranslate2 directory instead of a size, e.g. one produced with
+# `ct2-transformers-converter --model openai/whisper-small
+#  --output_dir ./whisper-small-ct2 --quantization int8`
+DEFAULT_MODEL = os.environ.get("WHISPER_MODEL", "small")
+MODEL_SIZES = ["tiny", "base", "small", "medium"]
+if DEFAULT_MODEL not in MODEL_SIZES:
+    MODEL_SIZES.insert(0, DEFAULT_MODEL)
+
+# Directory of pre-downloaded models, one subdirectory per size (e.g.
+# /models/small baked into the image); sizes found there load locally
+WHISPER_MODELS_ROOT = os.environ.get("WHISPER_MODELS_ROOT")
+
+def resolve_model(model):
+    """Maps a size name to its pre-downloaded directory when there is one."""
+    if WHISPER_MODELS_ROOT and os.path.isdir(os.path.join(WHISPER_MODELS_ROOT, model)):
+        return os.path.join(WHISPER_MODELS_ROOT, model)
+    return model
 
 # Load Whisper model (cached by Streamlit for performance)
+# max_entries=1 so switching sizes evicts the previous model instead of
+# keeping both resident
+@st.cache_resource(max_entries=1)
+def load_whisper_model(model):
+    # 1. `model` is a size name or a local CTranslate2 model directory.
+    #    One fixed worker layout per model, so every caller shares one
+    #    cache entry and switching files never reloads the model
+    # 2. On a GPU use int8_float16 (INT8 weights, FP16 compute, ~half the
+    #    VRAM of float16); on CPU "auto" lets CTranslate2 pick the fastest
+    #    supported compute type (int8, int8_bfloat16, ...)
+    # 3. A local directory (e.g. weights baked into the image) is loaded
+    #    without touching the Hugging Face Hub
+    if WHISPER_BACKEND == "ort":
+        from backends.ort_whisper import load_model
+        return warm_up(load_model(model, cpu_threads=CPU_THREADS))
+    if WHISPER_BACKEND != "faster_whisper":
+        raise ValueError(f"Unknown WHISPER_BACKEND: {WHISPER_BACKEND!r}")
+    device = os.environ.get("WHISPER_DEVICE", "auto")
+    if device == "auto":
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    model = resolve_model(model)
+    return warm_up(WhisperModel(model,
+                                device=device,
+                                compute_type="int8_float16" if device == "cuda" else "auto",
+                                cpu_threads=max(1, CPU_THREADS // PARALLEL_WORKERS),
+                                num_workers=PARALLEL_WORKERS,
+                                download_root=os.environ.get("WHISPER_CACHE_DIR"),
+                                local_files_only=os.path.isdir(model)))
+
+def warm_up(model):
+    """Runs a 1 s dummy transcription so kernel selection happens at load time."""
+    segments, info = model.transcribe(np.zeros(SAMPLING_RATE, dtype=np.float32),
+                                      language="en",
+                                      beam_size=1)
+    for _ in segments:
+        pass
+    return model
+
+# Larger uploads are not previewed: st.video would ship the whole file
+# (base64-encoded) to the browser on every rerun
+MAX_PREVIEW_BYTES = 50 * 1024 * 1024
+
+# Keep at most this many finished transcripts in memory
+TRANSCRIPT_CACHE_ENTRIES = 16
+
 @st.cache_resource
-def load_whisper_model():
-    # 1. Using "small" model
-    # 2. Optimized for CPU with "int8" compute type
-    return WhisperModel("base", device="cpu", compute_type="int8")
+def transcript_cache():
+    """Finished transcripts shared across sessions, keyed by file hash and settings."""
+    # Sessions run on separate threads, so every access goes through the lock
+    return OrderedDict(), threading.Lock()
 
-def transcribe_video(model, video_path):
-    """Transcribes the video and returns the text."""
-    try:
-        # The transcribe method returns a generator
-        # 3. Added vad_filter=True to skip silence
-        segments, info = model.transcribe(video_path,
-                                          beam_size=5,
-                                          vad_filter=True,
-                                          vad_parameters=dict(min_silence_duration_ms=500))
-        
-        # We must iterate over the segments to get the full text
-        transcript_text = ""
+def get_cached_transcript(key):
+    """Returns the cached transcript for `key` (marking it recently used), or None."""
+    cache, lock = transcript_cache()
+    with lock:
+        transcript_text = cache.get(key)
+        if transcript_text is not None:
+            cache.move_to_end(key)
+        return transcript_text
+
+def store_transcript(key, transcript_text):
+    """Caches a finished transcript, evicting the least recently used ones."""
+    cache, lock = transcript_cache()
+    with lock:
+        cache[key] = transcript_text
+        cache.move_to_end(key)
+        while len(cache) > TRANSCRIPT_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+def file_hash(uploaded_file):
+    """Hashes the upload without copying it (xxh3 runs at memory bandwidth)."""
+    return xxhash.xxh3_128(uploaded_file.getbuffer()).hexdigest()
+
+# "auto" makes faster-whisper run an extra language-detection pass
+LANGUAGES = ["en", "auto", "es", "fr", "de", "it", "pt", "nl", "hi", "ja", "zh"]
+
+def load_audio(uploaded_file):
+    """Decodes only the audio stream of the upload into a float32 NumPy array."""
+    # PyAV demuxes the audio stream and resamples to 16 kHz mono in one pass,
+    # straight from the in-memory upload (no temp file, no video decoding)
+    uploaded_file.seek(0)
+    return decode_audio(uploaded_file, sampling_rate=SAMPLING_RATE)
+
+# Refresh the live transcript every N segments while streaming
+STREAM_UPDATE_EVERY = 5
+
+# Number of VAD speech chunks packed into one encoder/decoder batch
+BATCH_SIZE = 8
+
+# Upper bound on the audio covered by one parallel group
+PARALLEL_CHUNK_S = 5 * 60
+
+# Silero VAD settings used to skip silence (tighter padding than the default)
+VAD_PARAMETERS = dict(min_silence_duration_ms=500, speech_pad_ms=200, threshold=0.45)
+
+# The encoder sees at most 30 s of audio per window
+WINDOW_S = 30
+
+def split_on_silence(audio, chunk_s=PARALLEL_CHUNK_S):
+    """Runs VAD once and groups its speech into ~chunk_s groups of <=30 s windows.
+
+    Windows are returned in seconds, the unit `clip_timestamps` expects.
+    """
+    vad_options = VadOptions(**VAD_PARAMETERS, max_speech_duration_s=WINDOW_S)
+    speech = get_speech_timestamps(audio, vad_options, sampling_rate=SAMPLING_RATE)
+    # Merge neighbouring speech spans into windows that fit one encoder pass;
+    # windows therefore start and end at silences
+    window_samples = WINDOW_S * SAMPLING_RATE
+    windows = []
+    for ts in speech:
+        if windows and ts["end"] - windows[-1]["start"] <= window_samples:
+            windows[-1]["end"] = ts["end"]
+        else:
+            windows.append({"start": ts["start"], "end": ts["end"]})
+    chunk_samples = chunk_s * SAMPLING_RATE
+    groups = []
+    for window in windows:
+        if not groups or window["start"] - groups[-1][0]["start"] >= chunk_samples:
+            groups.append([])
+        groups[-1].append(window)
+    return [[{"start": w["start"] / SAMPLING_RATE, "end": w["end"] / SAMPLING_RATE} for w in group]
+            for group in groups]
+
+def stream_segments(model, audio, language="en", beam_size=1):
+    """Yields the transcript text segment by segment as it is decoded."""
+    if WHISPER_BACKEND == "ort":
+        segments, info = model.transcribe(audio,
+                                          language=None if language == "auto" else language,
+                                          beam_size=beam_size,
+                                          batch_size=BATCH_SIZE)
         for segment in segments:
-            transcript_text += segment.text + " "
-            
-        return True, transcript_text.strip()
-        
-    except Exception as e:
-        tb = traceback.format_exc()
-        return False, f"Transcription failed: {e}\n{tb}"
+            yield segment.text
+        return
+
+    if PARALLEL_WORKERS == 1:
+        yield from stream_chunk(model, audio, language, beam_size)
+        return
+
+    # Fan the groups out across the model workers (CTranslate2 is
+    # thread-safe), at most PARALLEL_CHUNK_S each but small enough that
+    # short files still keep every worker busy. The first group streams
+    # live on this thread; the others run in the pool and are yielded in
+    # order as each one finishes. Only a single <=30 s speech window ends
+    # up on one worker.
+    duration_s = len(audio) / SAMPLING_RATE
+    groups = split_on_silence(audio, chunk_s=min(PARALLEL_CHUNK_S, duration_s / PARALLEL_WORKERS))
+    if not groups:
+        return
+    if len(groups) == 1:
+        yield from stream_chunk(model, audio, language, beam_size, groups[0])
+        return
+    if language == "auto":
+        # Detect once, on the first speech window, so every group decodes in
+        # the same language and the detection pass isn't repeated per group
+        first = groups[0][0]
+        speech = audio[int(first["start"] * SAMPLING_RATE):int(first["end"] * SAMPLING_RATE)]
+        language = model.detect_language(speech)[0] if model.model.is_multilingual else "en"
+    ex = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS - 1)
+    try:
+        futures = [ex.submit(lambda windows: list(stream_chunk(model, audio, language, beam_size, windows)),
+                             windows)
+                   for windows in groups[1:]]
+        yield from stream_chunk(model, audio, language, beam_size, groups[0])
+        for future in futures:
+            yield from future.result()
+    finally:
+        # If the consumer stops early, drop the queued groups and wait for
+        # the running ones so they don't keep decoding on cores the next
+        # request needs (at most one group per worker)
+        ex.shutdown(wait=True, cancel_futures=True)
+
+def stream_chunk(model, audio, language="en", beam_size=1, clip_timestamps=None):
+    """Yields the transcript text of `audio` (or just its given speech windows)."""
+    # The batched pipeline groups VAD speech chunks into a single batch
+    # instead of decoding them one at a time. It decodes at a single
+    # temperature with no compression-ratio/logprob fallback, so there is
+    # no temperature schedule or best_of to pass.
+    pipeline = BatchedInferencePipeline(model=model)
+    # The transcribe method returns a lazy generator
+    # 3. Added vad_filter=True to skip silence (with tighter padding), unless
+    #    the speech windows were already found by split_on_silence
+    segments, info = pipeline.transcribe(audio,
+                                         beam_size=beam_size,
+                                         language=None if language == "auto" else language,
+                                         # Plain-text output. These are already the batched
+                                         # pipeline's defaults (and it never conditions on the
+                                         # previous chunk); pinned so the decode stays lean
+                                         word_timestamps=False,
+                                         without_timestamps=True,
+                                         vad_filter=clip_timestamps is None,
+                                         vad_parameters=dict(VAD_PARAMETERS),
+                                         clip_timestamps=clip_timestamps,
+                                         batch_size=BATCH_SIZE)
+    for segment in segments:
+        yield segment.text
 
 # --- Streamlit UI ---
 
@@ -39,6 +257,16 @@ def main():
     st.set_page_config(page_title="Video Transcriber", layout="wide")
     st.title("Fast Video Transcriber ⚡️🎧📝")
 
+    model_size = st.selectbox("Model", MODEL_SIZES, index=MODEL_SIZES.index(DEFAULT_MODEL))
+
+    # Load and warm up the model on first page view instead of on first click
+    with st.spinner("Loading model... ⏳"):
+        load_whisper_model(model_size)
+    if st.session_state.get("model_size") not in (None, model_size):
+        # max_entries=1 has evicted the previous model; reclaim its memory now
+        gc.collect()
+    st.session_state["model_size"] = model_size
+
     # Instructions (MODIFIED AS REQUESTED)
     with st.expander("About this App", expanded=False):
         st.markdown("""
@@ -53,33 +281,53 @@ def main():
         type=["mp4", "mkv", "avi", "mov", "MP4", "MKV", "AVI", "MOV"]
     )
 
+    # Knowing the language upfront skips the detection encoder pass
+    language = st.selectbox("Language", LANGUAGES, index=0)
+    # 1 = greedy decoding (fastest); higher values use beam search
+    beam_size = st.slider("Beam size", 1, 5, 1)
+
     if uploaded_file is not None:
-        st.video(uploaded_file)
+        if uploaded_file.size < MAX_PREVIEW_BYTES:
+            st.video(uploaded_file)
+        else:
+            st.info(f"{uploaded_file.name} ({uploaded_file.size / (1024 * 1024):.0f} MB): preview skipped for large files")
         
         if st.button("Transcribe Video", type="primary"):
-            # Save uploaded file to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_file.name) as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                video_path = tmp_file.name
-            
             try:
-                model = load_whisper_model()
-                
-                # --- Transcription ---
-                start_transcribe = time.time()
-                with st.spinner("Transcribing video... (skipping silence) ⏳"):
-                    transcribe_ok, transcript_text = transcribe_video(model, video_path)
-                
-                if not transcribe_ok:
-                    st.error(f"Transcription Failed:\n{transcript_text}")
-                    return
-                
-                elapsed_transcribe = time.time() - start_transcribe
-                st.success(f"Transcription complete in {elapsed_transcribe:.1f}s! 🎉")
+                # Re-uploads of the same file with the same settings skip inference
+                cache_key = (file_hash(uploaded_file), model_size, language, beam_size)
+                transcript_text = get_cached_transcript(cache_key)
 
-                # --- Display Results ---
                 st.subheader("Raw Transcript")
-                st.text_area("Transcript", transcript_text, height=400)
+                placeholder = st.empty()
+                if transcript_text is not None:
+                    st.success("Loaded cached transcript! 🎉")
+                else:
+                    with st.spinner("Decoding audio... 🎧"):
+                        audio = load_audio(uploaded_file)
+                    model = load_whisper_model(model_size)
+
+                    # --- Transcription (streamed as segments are decoded) ---
+                    parts = []
+                    start_transcribe = time.time()
+                    try:
+                        with st.spinner("Transcribing video... (skipping silence) ⏳"):
+                            for text in stream_segments(model, audio, language, beam_size):
+                                parts.append(text)
+                                if len(parts) % STREAM_UPDATE_EVERY == 0:
+                                    placeholder.text(" ".join(parts))
+                    except Exception as e:
+                        st.error(f"Transcription Failed:\n{e}\n{traceback.format_exc()}")
+                        return
+                    transcript_text = " ".join(parts).strip()
+
+                    store_transcript(cache_key, transcript_text)
+
+                    elapsed_transcribe = time.time() - start_transcribe
+                    st.success(f"Transcription complete in {elapsed_transcribe:.1f}s! 🎉")
+
+                # --- Display Results ---
+                placeholder.text_area("Transcript", transcript_text, height=400)
                 st.download_button(
                     "Download Transcript",
                     transcript_text,
@@ -89,10 +337,6 @@ def main():
             except Exception as e:
                 st.error(f"An unexpected error occurred: {e}")
                 st.error(traceback.format_exc())
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(video_path):
-                    os.unlink(video_path)
 
 if __name__ == "__main__":
     main()